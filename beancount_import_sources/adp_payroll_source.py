@@ -49,12 +49,19 @@ Example usage:
     ]
     beancount_import.webserver.main(data_sources=data_sources, ...)
 
+Paystubs that the journal already references are not parsed again. Set
+`validate_imported_files=True` to re-read them, e.g. to detect paystubs that no
+longer produce a transaction.
+
+`memo_map` is optional. Instead of a 'grouptermlife' entry, the group term life
+accounts may also be given as `group_term_life_income_account` and
+`group_term_life_expenses_account`.
+
 """
 
 from typing import List, Optional, Tuple, Dict, Set
 import datetime
 import os
-import collections
 import functools
 import re
 import json
@@ -63,26 +70,48 @@ from beancount.core.number import D, ZERO, Decimal
 from beancount.core.data import Open, Transaction, Posting, Amount, Entries, Directive, EMPTY_SET
 from beancount_import.source import ImportResult, SourceResults, Source, AssociatedData, InvalidSourceReference
 from beancount_import.matching import FIXME_ACCOUNT
+from .journal_index import register_transaction_key, transactions_by_meta
 
 
 class Config(object):
     def __init__(self,
                  company_name,
                  earning_account_map, deduction_code_and_date_to_account,
-                 memo_map, **kwargs):
+                 memo_map=None,
+                 group_term_life_income_account=None,
+                 group_term_life_expenses_account=None,
+                 **kwargs):
         super().__init__(**kwargs)
         self.company_name = company_name
         self.earning_account_map = earning_account_map
         self.deduction_code_and_date_to_account = deduction_code_and_date_to_account
-        self.memo_map = memo_map
+        self.memo_map = dict(memo_map or {})
+        # Older configurations specify the group term life accounts directly
+        # rather than through memo_map.
+        if (group_term_life_income_account is None) != (group_term_life_expenses_account is None):
+            raise ValueError('group_term_life_income_account and group_term_life_expenses_account '
+                             'must be specified together')
+        if group_term_life_income_account is not None:
+            self.memo_map.setdefault('grouptermlife', [
+                group_term_life_income_account,
+                group_term_life_expenses_account,
+            ])
 
 class AdpPayrollSource(Config, Source):
     def __init__(self, data_dir: str, json_filenames: List[str],
+                 validate_imported_files: bool = False,
                  **kwargs) -> None:
         super().__init__(**kwargs)
         self.data_dir = data_dir
+        self.validate_imported_files = validate_imported_files
         self.json_filenames = sorted([os.path.realpath(x) for x in json_filenames])
+        self._relative_filenames = {
+            filename: os.path.relpath(filename, start=data_dir) for filename in self.json_filenames}
         self.example_posting_key_extractors = {'adp_payroll_posting_description': None}
+        register_transaction_key('adp_payroll_source_file')
+        # Results of deduction_code_and_date_to_account, which is called again for
+        # every paystub each time the journal is reloaded.
+        self._deduction_accounts: Dict[Tuple[str, datetime.date], str] = {}
 
     @property
     def name(self):
@@ -91,101 +120,120 @@ class AdpPayrollSource(Config, Source):
     def to_amount(self, json_amount) -> Amount:
         return Amount(currency=json_amount['currencyCode'], number=json_amount['amountValue'])
 
+    def _deduction_account(self, deduction_code_name: str, date: datetime.date) -> str:
+        key = (deduction_code_name, date)
+        account = self._deduction_accounts.get(key)
+        if account is None:
+            account = self.deduction_code_and_date_to_account(deduction_code_name, date)
+            self._deduction_accounts[key] = account
+        return account
+
+    def _read_transaction(self, filename: str, relative_filename: str) -> Transaction:
+        with open(filename) as f:
+            pay_statement = json.load(f, parse_float=Decimal)['payStatement']
+        date = datetime.date.fromisoformat(pay_statement['payDate'])
+        txn = Transaction(
+            meta={},
+            date=date,
+            flag='*',
+            payee=self.company_name,
+            narration='Payroll',
+            tags=EMPTY_SET,
+            links=EMPTY_SET,
+            postings=[])
+        txn.meta['adp_payroll_source_file'] = relative_filename
+        postings = txn.postings
+        earning_account_map = self.earning_account_map
+        memo_map = self.memo_map
+
+        for earning in pay_statement['earnings']:
+            earning_amount = earning.get('earningAmount')
+            if earning_amount is None: continue
+            desc = f"Earning: {earning['earningCodeName'].strip()}"
+            earning_account = earning_account_map[desc]
+            postings.append(
+                Posting(
+                    account=earning_account,
+                    # ADP reports earnings as a positive number. Flip the sign to match
+                    # accounting conventions (Income is negative).
+                    units=-self.to_amount(earning_amount),
+                    cost=None,
+                    meta={'adp_payroll_posting_description': desc},
+                    price=None,
+                    flag=None))
+
+        for deduction in pay_statement['deductions']:
+            deduction_amount = deduction.get('deductionAmount')
+            if deduction_amount is None: continue
+            # ADP reports all deductions as negative numbers. Flip the sign to match accounting
+            # conventions (Expenses are positive).
+            amount = -self.to_amount(deduction_amount)
+            deduction_code_name = f"{deduction['deductionCategoryCodeName']}: {deduction['CodeName'].strip()}"
+            deduction_account = self._deduction_account(deduction_code_name, date)
+            postings.append(
+                Posting(
+                    account=deduction_account,
+                    units=amount,
+                    cost=None,
+                    meta={'adp_payroll_posting_description': deduction_code_name},
+                    price=None,
+                    flag=None))
+
+        for memo in pay_statement['memos']:
+            name_code = memo['nameCode']
+            memo_accounts = memo_map.get(name_code['codeValue'])
+            if memo_accounts is None: continue
+            memo_income_account, memo_expense_account = memo_accounts
+            memo_amount = memo.get('memoAmount')
+            if memo_amount is None: continue
+            amount = self.to_amount(memo_amount)
+            memo_description = name_code['shortName'].strip()
+            postings.append(
+                Posting(
+                    account=memo_income_account,
+                    units=-amount,
+                    cost=None,
+                    meta={'adp_payroll_posting_description': memo_description},
+                    price=None,
+                    flag=None))
+            postings.append(
+                Posting(
+                    account=memo_expense_account,
+                    units=amount,
+                    cost=None,
+                    meta={'adp_payroll_posting_description': memo_description},
+                    price=None,
+                    flag=None))
+
+        return txn
+
     def prepare(self, journal, results: SourceResults):
         for adp_account, beancount_account in self.earning_account_map.items():
             results.add_account(beancount_account)
         # Scan the journal to see which files we have already imported.
-        existing_transactions_by_file = dict()
-        for transaction in journal.all_entries:
-            if not isinstance(transaction, Transaction): continue
-            meta = transaction.meta
-            if (meta and 'adp_payroll_source_file' in meta):
-                filename = meta['adp_payroll_source_file']
-                existing_transactions_by_file.setdefault(filename, []).append(transaction)
+        existing_transactions_by_file = transactions_by_meta(journal, 'adp_payroll_source_file')
 
         # Read all files and add pending entries not already imported into the journal.
-        imported_transactions_by_file = dict()
+        num_imported_transactions_by_file = Counter()
         for filename in self.json_filenames:
+            relative_filename = self._relative_filenames[filename]
+            if (relative_filename in existing_transactions_by_file
+                    and not self.validate_imported_files):
+                # Each paystub produces at most one transaction, and this one is
+                # already in the journal, so there is nothing to import.
+                num_imported_transactions_by_file[relative_filename] += 1
+                continue
             self.log_status('adp_payroll: processing %s' % (filename, ))
-            with open(filename) as f:
-                data = json.load(f, parse_float=Decimal)
-            date = datetime.datetime.strptime(data['payStatement']['payDate'], '%Y-%m-%d').date()
-            txn = Transaction(
-                meta=collections.OrderedDict(),
-                date=date,
-                flag='*',
-                payee=self.company_name,
-                narration='Payroll',
-                tags=EMPTY_SET,
-                links=EMPTY_SET,
-                postings=[])
-            relative_filename = os.path.relpath(filename, start=self.data_dir)
-            txn.meta['adp_payroll_source_file'] = relative_filename
-
-            for earning in data['payStatement']['earnings']:
-                if 'earningAmount' not in earning: continue
-                desc = 'Earning: ' + earning['earningCodeName'].strip()
-                earning_account = self.earning_account_map[desc]
-                txn.postings.append(
-                    Posting(
-                        account=earning_account,
-                        # ADP reports earnings as a positive number. Flip the sign to match
-                        # accounting conventions (Income is negative).
-                        units=-self.to_amount(earning['earningAmount']),
-                        cost=None,
-                        meta={'adp_payroll_posting_description': desc},
-                        price=None,
-                        flag=None))
-
-            for deduction in data['payStatement']['deductions']:
-                if 'deductionAmount' not in deduction: continue
-                # ADP reports all deductions as negative numbers. Flip the sign to match accounting
-                # conventions (Expenses are positive).
-                amount = -self.to_amount(deduction['deductionAmount'])
-                deduction_code_name = deduction['deductionCategoryCodeName'] + ': ' + deduction['CodeName'].strip()
-                deduction_account = self.deduction_code_and_date_to_account(deduction_code_name, date)
-                txn.postings.append(
-                    Posting(
-                        account=deduction_account,
-                        units=amount,
-                        cost=None,
-                        meta={'adp_payroll_posting_description': deduction_code_name},
-                        price=None,
-                        flag=None))
-
-            for memo in data['payStatement']['memos']:
-                if memo['nameCode']['codeValue'] not in self.memo_map: continue
-                memo_income_account, memo_expense_account = \
-                    self.memo_map[memo['nameCode']['codeValue']]
-                if 'memoAmount' not in memo: continue
-                amount = self.to_amount(memo['memoAmount'])
-                memo_description = memo['nameCode']['shortName'].strip()
-                txn.postings.append(
-                    Posting(
-                        account=memo_income_account,
-                        units=-amount,
-                        cost=None,
-                        meta={'adp_payroll_posting_description': memo_description},
-                        price=None,
-                        flag=None))
-                txn.postings.append(
-                    Posting(
-                        account=memo_expense_account,
-                        units=amount,
-                        cost=None,
-                        meta={'adp_payroll_posting_description': memo_description},
-                        price=None,
-                        flag=None))
-
+            txn = self._read_transaction(filename, relative_filename)
             if len(txn.postings) > 0:
-                imported_transactions_by_file.setdefault(relative_filename, []).append(txn)
+                num_imported_transactions_by_file[relative_filename] += 1
                 if relative_filename not in existing_transactions_by_file:
                     results.add_pending_entry(ImportResult(date=txn.date, entries=[txn], info=None))
 
         # Report transactions in the journal that have metadata that should
         # associate them with a source file, but that source file is not found.
         for filename, transactions in existing_transactions_by_file.items():
-            num_expected = len(imported_transactions_by_file.get(filename, []))
+            num_expected = num_imported_transactions_by_file[filename]
             if len(transactions) == num_expected: continue
             num_extra = len(transactions) - num_expected
             results.add_invalid_reference(
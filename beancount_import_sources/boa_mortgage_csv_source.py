@@ -22,7 +22,6 @@ Example usage:
 from typing import List, Optional, Tuple, Dict, Set
 import datetime
 import os
-import collections
 import functools
 import re
 import csv
@@ -32,6 +31,7 @@ from beancount.core.number import D, ZERO, Decimal
 from beancount.core.data import Open, Transaction, Posting, Amount, Entries, Directive, EMPTY_SET
 from beancount_import.source import ImportResult, SourceResults, Source, AssociatedData, InvalidSourceReference
 from beancount_import.matching import FIXME_ACCOUNT
+from .journal_index import register_transaction_key, transactions_by_meta
 
 
 class Config(object):
@@ -46,11 +46,17 @@ class Config(object):
 
 
 class BoAMortgageCsvSource(Config, Source):
+    # Characters to delete from amounts like "$1,234.56" before parsing.
+    _AMOUNT_TABLE = str.maketrans('', '', '$, \t\r\n')
+
     def __init__(self, data_dir: str, csv_filenames: List[str], **kwargs) -> None:
         super().__init__(**kwargs)
         self.data_dir = data_dir
         self.csv_filenames = sorted([os.path.realpath(x) for x in csv_filenames])
+        self._relative_filenames = {
+            filename: os.path.relpath(filename, start=data_dir) for filename in self.csv_filenames}
         self.example_posting_key_extractors = {}
+        register_transaction_key('boa_mortgage_csv_source_file')
 
     @property
     def name(self):
@@ -60,9 +66,23 @@ class BoAMortgageCsvSource(Config, Source):
         if s == '--':
             number = ZERO
         else:
-            number = Decimal(s.replace('$', '').replace(',', '').strip())
+            number = Decimal(s.translate(self._AMOUNT_TABLE))
         return Amount(currency='USD', number=number)
 
+    def _parse_date(self, s: str) -> datetime.date:
+        # Parses like strptime(s, '%m/%d/%y'), which is slow because it
+        # re-parses the format on every call. It requires a 1-2 digit month and
+        # day and an exactly 2-digit year, all ASCII digits. Unlike strptime, it
+        # rejects a space-padded day such as '1/ 5/23' and non-ASCII digits in
+        # the year.
+        month, day, year = s.split('/')
+        if not (0 < len(month) <= 2 and 0 < len(day) <= 2 and len(year) == 2
+                and (month + day + year).isascii() and (month + day + year).isdigit()):
+            raise ValueError(f'date {s!r} does not match format MM/DD/YY')
+        year = int(year)
+        year += 2000 if year < 69 else 1900
+        return datetime.date(year, int(month), int(day))
+
     def _get_transaction_key(self, txn: Transaction):
         filename = txn.meta['boa_mortgage_csv_source_file']
         description = txn.meta['boa_mortgage_csv_source_description']
@@ -80,10 +100,8 @@ class BoAMortgageCsvSource(Config, Source):
         # Scan the journal to see which transactions we have already imported.
         # Transactions are identified by file, date, and description.
         existing_transactions_by_file_date_desc = dict()
-        for transaction in journal.all_entries:
-            if not isinstance(transaction, Transaction): continue
-            meta = transaction.meta
-            if meta is not None and 'boa_mortgage_csv_source_file' in meta:
+        for transactions in transactions_by_meta(journal, 'boa_mortgage_csv_source_file').values():
+            for transaction in transactions:
                 key = self._get_transaction_key(transaction)
                 existing_transactions_by_file_date_desc.setdefault(key, []).append(transaction)
 
@@ -91,75 +109,80 @@ class BoAMortgageCsvSource(Config, Source):
         imported_transactions_by_file_date_desc = dict()
         for filename in self.csv_filenames:
             self.log_status('boa_mortgage_csv: processing %s' % (filename, ))
-            with open(filename) as f:
-                rows = list(csv.reader(f))[1:]
-            relative_filename = os.path.relpath(filename, start=self.data_dir)
-            for row in rows:
-                date = datetime.datetime.strptime(row[0], '%m/%d/%y').date()
-                description = row[1]
-                txn_type = row[2]
-                payment_amount = self._to_amount(row[3])
-                principal_amount = self._to_amount(row[5])
-                interest_amount = self._to_amount(row[6])
-                escrow_amount = self._to_amount(row[7])
-                fees_amount = self._to_amount(row[8])
-
-                txn = Transaction(
-                    meta=collections.OrderedDict(),
-                    date=date,
-                    flag='*',
-                    payee='Bank of America',
-                    narration=description,
-                    tags=EMPTY_SET,
-                    links=EMPTY_SET,
-                    postings=[])
-                txn.meta['boa_mortgage_csv_source_file'] = relative_filename
-                txn.meta['boa_mortgage_csv_source_description'] = description
-
-                txn.postings.append(Posting(
-                    account=self.payment_account,
-                    units=-payment_amount,
-                    cost=None,
-                    price=None,
-                    flag=None,
-                    meta={'boa_mortgage_csv_source_file': relative_filename}))
-                if principal_amount:
-                    txn.postings.append(Posting(
-                        account=self.loan_balance_account,
-                        units=principal_amount,
-                        cost=None,
-                        price=None,
-                        flag=None,
-                        meta={'boa_mortgage_csv_source_file': relative_filename}))
-                if interest_amount:
-                    txn.postings.append(Posting(
-                        account=self.interest_account,
-                        units=interest_amount,
-                        cost=None,
-                        price=None,
-                        flag=None,
-                        meta={'boa_mortgage_csv_source_file': relative_filename}))
-                if escrow_amount:
-                    txn.postings.append(Posting(
-                        account=self.escrow_account,
-                        units=escrow_amount,
-                        cost=None,
-                        price=None,
-                        flag=None,
-                        meta={'boa_mortgage_csv_source_file': relative_filename}))
-                if fees_amount:
+            relative_filename = self._relative_filenames[filename]
+            with open(filename, newline='') as f:
+                reader = csv.reader(f)
+                # Skip the header row.
+                next(reader, None)
+                for row in reader:
+                    date = self._parse_date(row[0])
+                    description = row[1]
+                    txn_type = row[2]
+                    payment_amount = self._to_amount(row[3])
+                    principal_amount = self._to_amount(row[5])
+                    interest_amount = self._to_amount(row[6])
+                    escrow_amount = self._to_amount(row[7])
+                    fees_amount = self._to_amount(row[8])
+
+                    txn = Transaction(
+                        meta={},
+                        date=date,
+                        flag='*',
+                        payee='Bank of America',
+                        narration=description,
+                        tags=EMPTY_SET,
+                        links=EMPTY_SET,
+                        postings=[])
+                    txn.meta['boa_mortgage_csv_source_file'] = relative_filename
+                    txn.meta['boa_mortgage_csv_source_description'] = description
+                    # All postings of a transaction carry the same metadata, so
+                    # they share a single dict.
+                    posting_meta = {'boa_mortgage_csv_source_file': relative_filename}
+
                     txn.postings.append(Posting(
-                        account=self.fees_account,
-                        units=fees_amount,
+                        account=self.payment_account,
+                        units=-payment_amount,
                         cost=None,
                         price=None,
                         flag=None,
-                        meta={'boa_mortgage_csv_source_file': relative_filename}))
-
-                key = self._get_transaction_key(txn)
-                imported_transactions_by_file_date_desc.setdefault(key, []).append(txn)
-                if key not in existing_transactions_by_file_date_desc:
-                    results.add_pending_entry(ImportResult(date=txn.date, entries=[txn], info=None))
+                        meta=posting_meta))
+                    if principal_amount:
+                        txn.postings.append(Posting(
+                            account=self.loan_balance_account,
+                            units=principal_amount,
+                            cost=None,
+                            price=None,
+                            flag=None,
+                            meta=posting_meta))
+                    if interest_amount:
+                        txn.postings.append(Posting(
+                            account=self.interest_account,
+                            units=interest_amount,
+                            cost=None,
+                            price=None,
+                            flag=None,
+                            meta=posting_meta))
+                    if escrow_amount:
+                        txn.postings.append(Posting(
+                            account=self.escrow_account,
+                            units=escrow_amount,
+                            cost=None,
+                            price=None,
+                            flag=None,
+                            meta=posting_meta))
+                    if fees_amount:
+                        txn.postings.append(Posting(
+                            account=self.fees_account,
+                            units=fees_amount,
+                            cost=None,
+                            price=None,
+                            flag=None,
+                            meta=posting_meta))
+
+                    key = self._get_transaction_key(txn)
+                    imported_transactions_by_file_date_desc.setdefault(key, []).append(txn)
+                    if key not in existing_transactions_by_file_date_desc:
+                        results.add_pending_entry(ImportResult(date=txn.date, entries=[txn], info=None))
 
 
         # Report transactions in the journal that have metadata that should
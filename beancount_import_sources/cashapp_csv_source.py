@@ -18,19 +18,16 @@ Example usage:
 
 """
 
-from typing import List, Optional, Tuple, Dict, Set
+from typing import List
 import datetime
 import os
 import collections
-import functools
-import re
 import csv
-from collections import Counter
-from beancount.core.amount import mul
 from beancount.core.number import D, ZERO, Decimal
 from beancount.core.data import Open, Transaction, Posting, Amount, Entries, Directive, EMPTY_SET
 from beancount_import.source import ImportResult, SourceResults, Source, AssociatedData, InvalidSourceReference
 from beancount_import.matching import FIXME_ACCOUNT
+from .journal_index import register_posting_key, transactions_by_posting_meta
 
 
 class Config(object):
@@ -40,6 +37,9 @@ class Config(object):
 
 
 class CashAppCsvSource(Config, Source):
+    # Deletes the non-printable ASCII characters, including newlines.
+    _CONTROL_CHARS_TABLE = dict.fromkeys([*range(0x20), 0x7f])
+
     def __init__(self, data_dir: str, csv_filenames: List[str], **kwargs) -> None:
         super().__init__(**kwargs)
         self.data_dir = data_dir
@@ -48,6 +48,7 @@ class CashAppCsvSource(Config, Source):
             'cashapp_payee': None,
             'cashapp_description': None,
         }
+        register_posting_key('cashapp_transaction_id')
 
     @property
     def name(self):
@@ -55,10 +56,10 @@ class CashAppCsvSource(Config, Source):
 
     def sanitize(self, string: str) -> str:
         # Remove all non-ASCII and non-printable ASCII characters, including newlines.
-        return re.sub(r'[^ -~]+', '', string)
+        return string.encode('ascii', 'ignore').decode('ascii').translate(self._CONTROL_CHARS_TABLE)
 
     def record_transaction(self, txn_id, txn: Transaction, results: SourceResults):
-        self.imported_transactions_by_id.setdefault(txn_id, []).append(txn)
+        self.imported_transactions_by_id[txn_id].append(txn)
         if txn_id not in self.existing_transactions_by_id:
             results.add_pending_entry(ImportResult(date=txn.date, entries=[txn], info=None))
 
@@ -137,62 +138,53 @@ class CashAppCsvSource(Config, Source):
         results.add_account(self.cashapp_account)
 
         # Scan the journal to see which transactions we have already imported.
-        self.existing_transactions_by_id = dict()
-        for transaction in journal.all_entries:
-            if not isinstance(transaction, Transaction): continue
-            for posting in transaction.postings:
-                meta = posting.meta
-                if (meta and 'cashapp_transaction_id' in meta):
-                    txn_id = meta['cashapp_transaction_id']
-                    self.existing_transactions_by_id.setdefault(txn_id, []).append(transaction)
+        self.existing_transactions_by_id = transactions_by_posting_meta(journal, 'cashapp_transaction_id')
 
         # Read all files and add pending transactions not already imported into the journal.
-        self.imported_transactions_by_id = dict()
+        self.imported_transactions_by_id = collections.defaultdict(list)
         for filename in self.csv_filenames:
             self.log_status('cashapp_csv: processing %s' % (filename, ))
-            with open(filename) as f:
-                rows = list(csv.reader(f))[1:]
-            for row in rows:
-                txn_id = row[0]
-                date = datetime.datetime.strptime(row[1][:-4], '%Y-%m-%d %H:%M:%S').date()
-                txn_type = row[2]
-                amount = Amount(currency=row[3], number=Decimal(row[4].replace('$', '')))
-                fee = row[5]
-                assert fee == '$0'
-                notes = row[11]
-                payee = row[12]
-                account = row[13]
-
-                if txn_type == 'Received P2P' or txn_type == 'Sent P2P':
-                    if account != 'Your Cash':
-                        # The outgoing payment is funded by an incoming transfer, or the incoming
-                        # payment is directly transferred.
+            with open(filename, newline='') as f:
+                reader = csv.reader(f)
+                # Skip the header row.
+                next(reader, None)
+                for (txn_id, date_str, txn_type, currency, amount_str, fee,
+                     _, _, _, _, _, notes, payee, account, *_) in reader:
+                    # Dates look like "2023-01-05 12:34:56 PST"; only the date is used.
+                    date = datetime.date.fromisoformat(date_str[:10])
+                    amount = Amount(currency=currency, number=Decimal(amount_str.replace('$', '')))
+                    assert fee == '$0'
+
+                    if txn_type == 'Received P2P' or txn_type == 'Sent P2P':
+                        if account != 'Your Cash':
+                            # The outgoing payment is funded by an incoming transfer, or the incoming
+                            # payment is directly transferred.
+                            self.make_transfer_transaction(
+                                txn_id=txn_id,
+                                date=date,
+                                transfer_to=account,
+                                amount=-amount,
+                                results=results,
+                                for_payment_notes=notes,
+                                for_payee=payee)
+
+                        self.make_payment_transaction(txn_id=txn_id,
+                                                      date=date,
+                                                      txn_type=txn_type,
+                                                      payee=payee,
+                                                      notes=notes,
+                                                      amount=amount,
+                                                      results=results)
+
+                    elif txn_type == 'Cash out':
                         self.make_transfer_transaction(
                             txn_id=txn_id,
                             date=date,
-                            transfer_to=account,
-                            amount=-amount,
-                            results=results,
-                            for_payment_notes=notes,
-                            for_payee=payee)
-
-                    self.make_payment_transaction(txn_id=txn_id,
-                                                  date=date,
-                                                  txn_type=txn_type,
-                                                  payee=payee,
-                                                  notes=notes,
-                                                  amount=amount,
-                                                  results=results)
-
-                elif txn_type == 'Cash out':
-                    self.make_transfer_transaction(
-                        txn_id=txn_id,
-                        date=date,
-                        transfer_to='bank',
-                        amount=amount,
-                        results=results)
-                else:
-                    assert False, txn_type
+                            transfer_to='bank',
+                            amount=amount,
+                            results=results)
+                    else:
+                        assert False, txn_type
 
 
         # Report transactions in the journal that do not have a corresponding transaction in the
@@ -207,7 +199,7 @@ class CashAppCsvSource(Config, Source):
                                        [(transaction, None) for transaction in transactions]))
 
     def is_posting_cleared(self, posting: Posting):
-        return 'cashapp_transaction_id' in posting.meta
+        return (posting.meta is not None) and ('cashapp_transaction_id' in posting.meta)
 
 def load(spec, log_status):
     return CashAppCsvSource(log_status=log_status, **spec)
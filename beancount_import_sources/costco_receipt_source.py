@@ -34,18 +34,16 @@ Example usage:
 
 """
 
-from typing import List, Optional, Tuple, Dict, Set
+from typing import List, Optional
 import datetime
 import os
 import collections
-import functools
-import re
 import json
-from collections import Counter
 from beancount.core.number import D, ZERO, Decimal
 from beancount.core.data import Open, Transaction, Posting, Amount, Entries, Directive, EMPTY_SET
 from beancount_import.source import ImportResult, SourceResults, Source, AssociatedData, InvalidSourceReference
 from beancount_import.matching import FIXME_ACCOUNT
+from .journal_index import register_transaction_key, transactions_by_meta
 
 
 class Config(object):
@@ -71,6 +69,13 @@ class Config(object):
 
 
 class CostcoReceiptSource(Config, Source):
+    _WAREHOUSE_ADDRESS_KEYS = (
+        'warehouseName', 'warehouseAddress1', 'warehouseAddress2', 'warehouseCity',
+        'warehouseState', 'warehouseCountry', 'warehousePostalCode'
+    )
+    _ITEM_DESCRIPTION_KEYS = ('itemNumber', 'itemDescription01', 'itemDescription02')
+    _TENDER_DESCRIPTION_KEYS = ('tenderDescription', 'displayAccountNumber')
+
     def __init__(self, data_dir: str, json_filenames: List[str], **kwargs) -> None:
         super().__init__(**kwargs)
         self.data_dir = data_dir
@@ -81,6 +86,7 @@ class CostcoReceiptSource(Config, Source):
             'costco_receipt_tax_flag': None,
             'costco_receipt_tender_description': None,
         }
+        register_transaction_key('costco_receipt_barcode')
 
     @property
     def name(self):
@@ -94,13 +100,18 @@ class CostcoReceiptSource(Config, Source):
         results.add_account(self.sales_tax_expenses_account)
         results.add_account(self.rewards_tender_account)
 
+        # Expenses account for each item identifier. Items with any other
+        # identifier go to other_expenses_account.
+        item_account_by_identifier = {
+            'E': self.food_stamp_eligible_expenses_account,
+            'F': self.health_fsa_eligible_expenses_account,
+        }
+
         # Scan the journal to see which transactions we have already imported.
-        existing_transactions_by_barcode = dict()
-        for transaction in journal.all_entries:
-            if not isinstance(transaction, Transaction): continue
-            meta = transaction.meta
-            if (meta and 'costco_receipt_barcode' in meta):
-                existing_transactions_by_barcode[meta['costco_receipt_barcode']] = transaction
+        existing_transactions_by_barcode = {
+            barcode: transactions[-1]
+            for barcode, transactions in transactions_by_meta(journal, 'costco_receipt_barcode').items()
+        }
 
         # Read all files and add pending entries not already imported into the journal.
         imported_transactions_by_barcode = dict()
@@ -108,10 +119,12 @@ class CostcoReceiptSource(Config, Source):
             self.log_status('costco_receipt: processing %s' % (filename, ))
             relative_filename = os.path.relpath(filename, start=self.data_dir)
             with open(filename) as f:
-                data = json.load(f, parse_float=Decimal)
+                # Parse integers as Decimal too, so that amounts can be used
+                # directly regardless of whether they have a fractional part.
+                data = json.load(f, parse_float=Decimal, parse_int=Decimal)
             for order in data:
                 if order['documentType'] != 'WarehouseReceiptDetail': continue
-                date = datetime.datetime.strptime(order['transactionDateTime'], '%Y-%m-%dT%H:%M:%S').date()
+                date = datetime.date.fromisoformat(order['transactionDateTime'][:10])
                 txn = Transaction(
                     meta=collections.OrderedDict(),
                     date=date,
@@ -125,19 +138,18 @@ class CostcoReceiptSource(Config, Source):
                 txn.meta['costco_receipt_order_datetime'] = order['transactionDateTime']
                 txn.meta['costco_receipt_order_type'] = order['transactionType']
                 txn.meta['costco_receipt_barcode'] = order['transactionBarcode']
-                warehouse_address_keys = [
-                    'warehouseName', 'warehouseAddress1', 'warehouseAddress2', 'warehouseCity',
-                    'warehouseState', 'warehouseCountry', 'warehousePostalCode'
-                ]
-                warehouse_address_parts = [str(order[k]) for k in warehouse_address_keys if order[k]]
-                txn.meta['costco_receipt_warehouse'] = ', '.join(warehouse_address_parts)
+                txn.meta['costco_receipt_warehouse'] = ', '.join(
+                    str(order[k]) for k in self._WAREHOUSE_ADDRESS_KEYS if order[k])
 
                 # Gather all rebates so we can look them up for each item.
                 rebate_by_item_number = {}
+                items = []
                 for item in order['itemArray']:
                     item_number = self._rebated_item_number_if_rebate(item)
                     if item_number is not None:
                         rebate_by_item_number[item_number] = item['amount']
+                    else:
+                        items.append(item)
 
                 if len(rebate_by_item_number) == 0:
                     # Older receipts group all rebates under an "instant savings" category. Since we
@@ -148,34 +160,28 @@ class CostcoReceiptSource(Config, Source):
                         txn.postings.append(
                             Posting(
                                 account=self.discount_expenses_account,
-                                units=Amount(currency='USD', number=Decimal(-savings)),
+                                units=Amount(currency='USD', number=-savings),
                                 cost=None,
                                 meta={},
                                 price=None,
                                 flag=None))
 
-                for item in order['itemArray']:
-                    if self._rebated_item_number_if_rebate(item) is not None: continue
-                    item_description_keys = [
-                        'itemNumber', 'itemDescription01', 'itemDescription02'
-                    ]
-                    item_description_parts = [str(item[k]) for k in item_description_keys if item[k]]
+                for item in items:
+                    item_description = ' '.join(
+                        str(item[k]) for k in self._ITEM_DESCRIPTION_KEYS if item[k])
                     item_amount = item['amount']
-                    if str(item['itemNumber']) in rebate_by_item_number:
-                        item_amount += rebate_by_item_number[str(item['itemNumber'])]
-                    desc_list = re.sub(' +', ' ', ' '.join(item_description_parts)).strip()
-
-                    if item['itemIdentifier'] == 'E':
-                        item_account = self.food_stamp_eligible_expenses_account
-                    elif item['itemIdentifier'] == 'F':
-                        item_account = self.health_fsa_eligible_expenses_account
-                    else:
-                        item_account = self.other_expenses_account
+                    rebate = rebate_by_item_number.get(str(item['itemNumber']))
+                    if rebate is not None:
+                        item_amount += rebate
+                    desc_list = ' '.join(item_description.split())
+
+                    item_account = item_account_by_identifier.get(
+                        item['itemIdentifier'], self.other_expenses_account)
 
                     txn.postings.append(
                         Posting(
                             account=item_account,
-                            units=Amount(currency='USD', number=Decimal(item_amount)),
+                            units=Amount(currency='USD', number=item_amount),
                             cost=None,
                             meta={
                                 'costco_receipt_item_description': desc_list,
@@ -190,18 +196,15 @@ class CostcoReceiptSource(Config, Source):
                 txn.postings.append(
                     Posting(
                         account=self.sales_tax_expenses_account,
-                        units=Amount(currency='USD', number=Decimal(order['taxes'])),
+                        units=Amount(currency='USD', number=order['taxes']),
                         cost=None,
                         meta={},
                         price=None,
                         flag=None))
 
                 for tender in order['tenderArray']:
-                    tender_description_keys = [
-                        'tenderDescription', 'displayAccountNumber'
-                    ]
-                    tender_description_parts = [str(tender[k]) for k in tender_description_keys if tender[k]]
-                    tender_description = ', '.join(tender_description_parts)
+                    tender_description = ', '.join(
+                        str(tender[k]) for k in self._TENDER_DESCRIPTION_KEYS if tender[k])
 
                     # Determine which account paid for this order. We don't want to use
                     # Expenses:FIXME for this posting, because that would produce a transaction that
@@ -216,7 +219,7 @@ class CostcoReceiptSource(Config, Source):
                     txn.postings.append(
                         Posting(
                             account=tender_account,
-                            units=Amount(currency='USD', number=Decimal(-tender['amountTender'])),
+                            units=Amount(currency='USD', number=-tender['amountTender']),
                             cost=None,
                             meta={
                                 'costco_receipt_tender_description': tender_description,
@@ -237,7 +240,7 @@ class CostcoReceiptSource(Config, Source):
     def is_posting_cleared(self, posting: Posting):
         return True
 
-    def _rebated_item_number_if_rebate(self, item) -> int:
+    def _rebated_item_number_if_rebate(self, item) -> Optional[str]:
         if (item['itemDescription01'] or '').startswith('/'):
             description = item['itemDescription01']
         elif (item['frenchItemDescription1'] or '').startswith('/'):
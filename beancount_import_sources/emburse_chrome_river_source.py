@@ -27,20 +27,25 @@ Example usage:
 
 """
 
-from typing import List, Optional, Tuple, Dict, Set, NamedTuple
+from typing import List, NamedTuple
 import datetime
 import os
 import collections
-import functools
-import re
 import csv
-import pandas as pd
-from collections import Counter
-from beancount.core.amount import mul
 from beancount.core.number import D, ZERO, Decimal
 from beancount.core.data import Open, Transaction, Posting, Amount, Entries, Directive, EMPTY_SET
 from beancount_import.source import ImportResult, SourceResults, Source, AssociatedData, InvalidSourceReference
 from beancount_import.matching import FIXME_ACCOUNT
+from .journal_index import register_transaction_key, transactions_by_meta
+
+
+class ExpenseItem(NamedTuple):
+    report_name: str
+    transaction_date: datetime.date
+    expense_type: str
+    amount: Amount
+    business_purpose: str
+    report_id: str
 
 
 class Config(object):
@@ -58,6 +63,7 @@ class EmburseChromeRiverSource(Config, Source):
         self.example_posting_key_extractors = {
             'emburse_chrome_river_expense_type': None,
             'emburse_chrome_river_business_purpose': None}
+        register_transaction_key('emburse_chrome_river_report_id')
 
     @property
     def name(self):
@@ -70,6 +76,20 @@ class EmburseChromeRiverSource(Config, Source):
             number = Decimal(s.replace('$', '').replace(',', '').strip())
         return Amount(currency='USD', number=number)
 
+    def _parse_date(self, s: str) -> datetime.date:
+        # Parses like strptime(s, '%m/%d/%y'), which is slow because it
+        # re-parses the format on every call. It requires a 1-2 digit month and
+        # day and an exactly 2-digit year, all ASCII digits. Unlike strptime, it
+        # rejects a space-padded day such as '1/ 5/23' and non-ASCII digits in
+        # the year.
+        month, day, year = s.split('/')
+        if not (0 < len(month) <= 2 and 0 < len(day) <= 2 and len(year) == 2
+                and (month + day + year).isascii() and (month + day + year).isdigit()):
+            raise ValueError(f'date {s!r} does not match format MM/DD/YY')
+        year = int(year)
+        year += 2000 if year < 69 else 1900
+        return datetime.date(year, int(month), int(day))
+
     def _drop_trailing_nones(self, l: list) -> list:
         while len(l) > 0 and (l[-1] is None or l[-1].strip() == ''):
             l.pop()
@@ -78,16 +98,10 @@ class EmburseChromeRiverSource(Config, Source):
     def prepare(self, journal, results: SourceResults):
         # Scan the journal to see which transactions we have already imported.
         # Transactions are identified by report id.
-        existing_transactions_by_report_id = dict()
-        for transaction in journal.all_entries:
-            if not isinstance(transaction, Transaction): continue
-            meta = transaction.meta
-            if meta is not None and 'emburse_chrome_river_report_id' in meta:
-                key = transaction.meta['emburse_chrome_river_report_id']
-                existing_transactions_by_report_id.setdefault(key, []).append(transaction)
+        existing_transactions_by_report_id = transactions_by_meta(journal, 'emburse_chrome_river_report_id')
 
         # Read all files and add pending entries not already imported into the journal.
-        imported_transactions_by_report_id = dict()
+        imported_transactions_by_report_id = collections.defaultdict(list)
         for filename in self.csv_filenames:
             self.log_status('emburse_chrome_river: processing %s' % (filename, ))
             with open(filename) as f:
@@ -95,28 +109,23 @@ class EmburseChromeRiverSource(Config, Source):
             relative_filename = os.path.relpath(filename, start=self.data_dir)
 
             # Group expense items by report id.
-            ExpenseItem = NamedTuple('ExpenseItem', [
-                ('report_name', str),
-                ('transaction_date', datetime.date),
-                ('expense_type', str),
-                ('amount', Amount),
-                ('business_purpose', str),
-                ('report_id', str)])
-            expense_items_by_report_id = dict()
+            expense_items_by_report_id = collections.defaultdict(list)
             for row in rows:
                 # Skip header rows.
                 if row[0] == 'Report Name': continue
                 # Skip summary rows
                 if len(self._drop_trailing_nones(row)) != 14: continue
 
+                (report_name, transaction_date, expense_type, _, _, _, _, _,
+                 amount, currency, _, business_purpose, report_id, _) = row
                 expense_item = ExpenseItem(
-                    report_name = row[0],
-                    transaction_date = datetime.datetime.strptime(row[1], '%m/%d/%y').date(),
-                    expense_type = row[2],
-                    amount = Amount(currency=row[9], number=Decimal(row[8])),
-                    business_purpose = row[11],
-                    report_id = row[12])
-                expense_items_by_report_id.setdefault(expense_item.report_id, []).append(expense_item)
+                    report_name = report_name,
+                    transaction_date = self._parse_date(transaction_date),
+                    expense_type = expense_type,
+                    amount = Amount(currency=currency, number=Decimal(amount)),
+                    business_purpose = business_purpose,
+                    report_id = report_id)
+                expense_items_by_report_id[expense_item.report_id].append(expense_item)
 
             for report_id, expense_items in expense_items_by_report_id.items():
                 last_transaction_date = max(e.transaction_date for e in expense_items)
@@ -156,7 +165,7 @@ class EmburseChromeRiverSource(Config, Source):
                         flag=None,
                         meta={}))
 
-                imported_transactions_by_report_id.setdefault(report_id, []).append(txn)
+                imported_transactions_by_report_id[report_id].append(txn)
                 if report_id not in existing_transactions_by_report_id:
                     results.add_pending_entry(ImportResult(date=txn.date, entries=[txn], info=None))
 
@@ -0,0 +1,88 @@
+"""Index of journal transactions by source metadata.
+
+beancount-import calls `prepare` on every source with the same journal, and each
+source scans the journal for the transactions it imported previously, which it
+identifies by a transaction or posting metadata key such as
+`adp_payroll_source_file`. Instead of having each source walk
+`journal.all_entries` separately, the sources share an index that is built in a
+single pass and reused until the journal changes.
+
+Each source registers its keys when it is constructed. beancount-import
+constructs all sources before calling `prepare` on any of them, so the first
+`prepare` indexes every key in a single pass.
+"""
+
+from typing import Any, Dict, List, Optional, Set
+from beancount.core.data import Transaction
+
+
+class JournalIndex(object):
+    def __init__(self, entries: list, transaction_keys: Set[str], posting_keys: Set[str]) -> None:
+        self.entries = entries
+        self.by_transaction_meta: Dict[str, Dict[Any, List[Transaction]]] = {
+            key: {} for key in transaction_keys}
+        self.by_posting_meta: Dict[str, Dict[Any, List[Transaction]]] = {
+            key: {} for key in posting_keys}
+        for entry in entries:
+            if not isinstance(entry, Transaction): continue
+            meta = entry.meta
+            if meta:
+                for key, transactions_by_value in self.by_transaction_meta.items():
+                    value = meta.get(key)
+                    if value is not None:
+                        transactions_by_value.setdefault(value, []).append(entry)
+            if not self.by_posting_meta: continue
+            for posting in entry.postings:
+                meta = posting.meta
+                if not meta: continue
+                for key, transactions_by_value in self.by_posting_meta.items():
+                    value = meta.get(key)
+                    if value is not None:
+                        transactions_by_value.setdefault(value, []).append(entry)
+
+
+_transaction_keys: Set[str] = set()
+_posting_keys: Set[str] = set()
+_cached_index: Optional[JournalIndex] = None
+
+
+def _get_index(journal) -> JournalIndex:
+    global _cached_index
+    entries = journal.all_entries
+    # beancount-import replaces `all_entries` with a new list whenever the
+    # journal changes, so the list identity tells us whether the index is stale.
+    if (_cached_index is None or _cached_index.entries is not entries
+            or not _transaction_keys.issubset(_cached_index.by_transaction_meta)
+            or not _posting_keys.issubset(_cached_index.by_posting_meta)):
+        _cached_index = JournalIndex(entries, _transaction_keys, _posting_keys)
+    return _cached_index
+
+
+def register_transaction_key(key: str) -> None:
+    """Includes transaction metadata `key` in the next index built."""
+    _transaction_keys.add(key)
+
+
+def register_posting_key(key: str) -> None:
+    """Includes posting metadata `key` in the next index built."""
+    _posting_keys.add(key)
+
+
+def transactions_by_meta(journal, key: str) -> Dict[Any, List[Transaction]]:
+    """Returns the transactions in `journal` grouped by the value of metadata `key`.
+
+    Transactions without `key` in their metadata are omitted. The result is
+    shared between sources and must not be modified.
+    """
+    _transaction_keys.add(key)
+    return _get_index(journal).by_transaction_meta[key]
+
+
+def transactions_by_posting_meta(journal, key: str) -> Dict[Any, List[Transaction]]:
+    """Returns the transactions in `journal` grouped by the value of posting metadata `key`.
+
+    A transaction appears once for each of its postings that has `key`. The
+    result is shared between sources and must not be modified.
+    """
+    _posting_keys.add(key)
+    return _get_index(journal).by_posting_meta[key]
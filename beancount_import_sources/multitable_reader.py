@@ -6,24 +6,20 @@ class MultiTableReader:
         pass
 
     def _is_section_title(self, row):
-        return len(self._drop_trailing_nones(row)) == 1
+        return self._logical_len(row) == 1
 
-    def _drop_trailing_nones(self, l: list) -> list:
-        while len(l) > 0 and l[-1] is None:
-            l.pop()
-        return l
+    def _logical_len(self, l: list) -> int:
+        # Length of l ignoring trailing Nones. Unlike popping them, this leaves
+        # the caller's row intact.
+        n = len(l)
+        while n > 0 and l[n - 1] is None:
+            n -= 1
+        return n
 
     def _get_rows(self, data: list[list[str]], columns: list[str]) -> list[list[str]]:
-        result = []
-        for row_in in data:
-            row_out = []
-            for i in range(len(columns)):
-                if i < len(row_in):
-                    row_out.append(row_in[i])
-                else:
-                    row_out.append(None)
-            result.append(row_out)
-        return result
+        # Truncate or pad each row with Nones to the number of columns.
+        n = len(columns)
+        return [list(row[:n]) + [None] * (n - len(row)) for row in data]
 
     def read_tables(self, rows: list[list[str]]) -> dict[str, pd.DataFrame]:
         grouped_rows = {}
@@ -40,7 +36,7 @@ class MultiTableReader:
             if len(rows) == 0:
                 df = pd.DataFrame()
             else:
-                columns = rows[0]
+                columns = rows[0][:self._logical_len(rows[0])]
                 data = self._get_rows(data=rows[1:], columns=columns)
                 df = pd.DataFrame.from_records(data=data, columns=columns)
             result[table_name] = df
@@ -23,20 +23,24 @@ Example usage:
     ]
     beancount_import.webserver.main(data_sources=data_sources, ...)
 
+Files are always read, but a Venmo transaction is not converted again when the
+journal already has every ledger transaction it would produce, so one file may
+have some transactions skipped and others converted. Set
+`reconvert_imported_transactions=True` to convert every transaction anyway, e.g.
+to check that the imported ones still pass the payee and action checks.
+
 """
 
-from typing import List, Optional, Tuple, Dict, Set
+from typing import List, Optional
 import datetime
 import os
 import collections
-import functools
-import re
 import json
-from collections import Counter
 from beancount.core.number import D, ZERO, Decimal
 from beancount.core.data import Open, Transaction, Posting, Amount, Entries, Directive, EMPTY_SET
 from beancount_import.source import ImportResult, SourceResults, Source, AssociatedData, InvalidSourceReference
 from beancount_import.matching import FIXME_ACCOUNT
+from .journal_index import register_posting_key, transactions_by_posting_meta
 
 
 class Config(object):
@@ -50,14 +54,21 @@ class Config(object):
 
 
 class VenmoJsonSource(Config, Source):
-    def __init__(self, data_dir: str, json_filenames: List[str], **kwargs) -> None:
+    # Deletes the non-printable ASCII characters, including newlines.
+    _CONTROL_CHARS_TABLE = dict.fromkeys([*range(0x20), 0x7f])
+
+    def __init__(self, data_dir: str, json_filenames: List[str],
+                 reconvert_imported_transactions: bool = False,
+                 **kwargs) -> None:
         super().__init__(**kwargs)
         self.data_dir = data_dir
+        self.reconvert_imported_transactions = reconvert_imported_transactions
         self.json_filenames = sorted([os.path.realpath(x) for x in json_filenames])
         self.example_posting_key_extractors = {
             'venmo_payee': None,
             'venmo_description': None,
         }
+        register_posting_key('venmo_transaction_id')
 
     @property
     def name(self):
@@ -68,20 +79,21 @@ class VenmoJsonSource(Config, Source):
 
     def sanitize(self, string: str) -> str:
         # Remove all non-ASCII and non-printable ASCII characters, including newlines.
-        return re.sub(r'[^ -~]+', '', string)
+        return string.encode('ascii', 'ignore').decode('ascii').translate(self._CONTROL_CHARS_TABLE)
 
     def record_transaction(self, transaction, txn: Transaction, results: SourceResults):
-        self.imported_transactions_by_id.setdefault(transaction['id'], []).append(txn)
+        self.imported_transactions_by_id[transaction['id']].append(txn)
         if transaction['id'] not in self.existing_transactions_by_id:
             results.add_pending_entry(ImportResult(date=txn.date, entries=[txn], info=None))
 
     def make_payment_transaction(self, transaction, payment, payee, amount_coef, results: SourceResults):
+        note = self.sanitize(payment['note'])
         txn = Transaction(
             meta={},
             date=self.get_transaction_date(transaction),
             flag='*',
             payee=self.get_user_info(payee, 'display_name'),
-            narration='Venmo ' + transaction['type'] + ': ' + self.sanitize(payment['note']),
+            narration='Venmo ' + transaction['type'] + ': ' + note,
             tags=EMPTY_SET,
             links=EMPTY_SET,
             postings=[])
@@ -94,7 +106,7 @@ class VenmoJsonSource(Config, Source):
                     'venmo_transaction_id': transaction['id'],
                     'venmo_payee': self.get_user_info(payee, 'username', 'display_name'),
                     'venmo_type': payment['action'],
-                    'venmo_description': self.sanitize(payment['note']),
+                    'venmo_description': note,
                 },
                 price=None,
                 flag=None))
@@ -145,33 +157,38 @@ class VenmoJsonSource(Config, Source):
         self.record_transaction(transaction, txn, results)
 
     def get_user_info(self, actor, *attrs):
-        if 'user' in actor:
-            d = actor['user']
-        else:
-            d = actor
+        d = actor.get('user', actor)
         for attr in attrs:
-            if attr in d and d[attr] is not None:
-                return d[attr]
+            value = d.get(attr)
+            if value is not None:
+                return value
         return '(unknown)'
 
+    def num_ledger_transactions(self, transaction) -> Optional[int]:
+        # Number of ledger transactions that prepare() creates for a Venmo
+        # transaction, or None if it does not recognize the transaction type.
+        txn_type = transaction['type']
+        if txn_type == 'payment' or txn_type == 'refund':
+            funding_source = transaction['funding_source']
+            if funding_source and funding_source['type'] in ['bank', 'transfer']:
+                return 2
+            return 1
+        elif txn_type == 'transfer' or txn_type == 'disbursement':
+            return 1
+        return None
+
     def get_transaction_date(self, transaction) -> datetime.date:
-        return datetime.datetime.strptime(transaction['datetime_created'], '%Y-%m-%dT%H:%M:%S').date()
+        # Timestamps look like "2023-01-05T10:00:00"; only the date is used.
+        return datetime.date.fromisoformat(transaction['datetime_created'][:10])
 
     def prepare(self, journal, results: SourceResults):
         results.add_account(self.venmo_assets_account)
 
         # Scan the journal to see which transactions we have already imported.
-        self.existing_transactions_by_id = dict()
-        for transaction in journal.all_entries:
-            if not isinstance(transaction, Transaction): continue
-            for posting in transaction.postings:
-                meta = posting.meta
-                if (meta and 'venmo_transaction_id' in meta):
-                    txn_id = meta['venmo_transaction_id']
-                    self.existing_transactions_by_id.setdefault(txn_id, []).append(transaction)
+        self.existing_transactions_by_id = transactions_by_posting_meta(journal, 'venmo_transaction_id')
 
         # Read all files and add pending transactions not already imported into the journal.
-        self.imported_transactions_by_id = dict()
+        self.imported_transactions_by_id = collections.defaultdict(list)
         for filename in self.json_filenames:
             self.log_status('venmo_json: processing %s' % (filename, ))
             with open(filename) as f:
@@ -179,6 +196,14 @@ class VenmoJsonSource(Config, Source):
             for transaction in data['data']['transactions']:
                 txn_id = transaction['id']
                 txn_type = transaction['type']
+                existing_transactions = self.existing_transactions_by_id.get(txn_id)
+                if (existing_transactions is not None and not self.reconvert_imported_transactions
+                        and len(existing_transactions) == self.num_ledger_transactions(transaction)):
+                    # This transaction is already fully imported, so there is no
+                    # need to convert it again. Count the journal's transactions
+                    # as imported so that they are not reported as invalid.
+                    self.imported_transactions_by_id[txn_id].extend(existing_transactions)
+                    continue
                 if txn_type == 'payment' or txn_type == 'refund':
                     if txn_type == 'payment':
                         payment = transaction['payment']
@@ -266,7 +291,7 @@ class VenmoJsonSource(Config, Source):
                                        [(transaction, None) for transaction in transactions]))
 
     def is_posting_cleared(self, posting: Posting):
-        return 'venmo_transaction_id' in posting.meta
+        return (posting.meta is not None) and ('venmo_transaction_id' in posting.meta)
 
 def load(spec, log_status):
     return VenmoJsonSource(log_status=log_status, **spec)
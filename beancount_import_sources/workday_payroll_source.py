@@ -65,22 +65,19 @@ Example usage:
 
 """
 
-from typing import List, Optional, Tuple, Dict, Set
+from typing import List
 import glob
 import datetime
 import os
 import collections
-import functools
-import re
-import json
 import warnings
 import openpyxl
 from .multitable_reader import MultiTableReader
-from collections import Counter
 from beancount.core.number import D, ZERO, Decimal
 from beancount.core.data import Open, Transaction, Posting, Amount, Entries, Directive, EMPTY_SET
 from beancount_import.source import ImportResult, SourceResults, Source, AssociatedData, InvalidSourceReference
 from beancount_import.matching import FIXME_ACCOUNT
+from .journal_index import register_transaction_key, transactions_by_meta
 import numpy as np
 
 
@@ -92,6 +89,11 @@ class Config(object):
 
 
 class WorkdayPayrollSource(Config, Source):
+    # Postings to these accounts are normally negative.
+    _CREDIT_ACCOUNT_PREFIXES = ('Income:', 'Equity:', 'Liabilities:')
+    # Postings to these accounts are normally positive.
+    _DEBIT_ACCOUNT_PREFIXES = ('Expenses:', 'Assets:')
+
     def __init__(self, data_dir: str, xlsx_dir: str,
                  authoritative_accounts: List[str], **kwargs) -> None:
         super().__init__(**kwargs)
@@ -103,6 +105,7 @@ class WorkdayPayrollSource(Config, Source):
         ])
         self.authoritative_accounts = authoritative_accounts
         self.example_posting_key_extractors = {'workday_payroll_posting_description': None}
+        register_transaction_key('workday_payroll_source_file')
 
     @property
     def name(self):
@@ -110,50 +113,55 @@ class WorkdayPayrollSource(Config, Source):
 
     def _to_amount(self, amount, account, currency) -> Amount:
         if np.isnan(amount): return None
-        if amount > 0 and any(account.startswith(prefix)
-                              for prefix in ['Income:', 'Equity:', 'Liabilities:']):
+        if amount > 0 and account.startswith(self._CREDIT_ACCOUNT_PREFIXES):
             amount *= -1
-        if amount < 0 and any(account.startswith(prefix)
-                              for prefix in ['Expenses:', 'Assets:']):
+        if amount < 0 and account.startswith(self._DEBIT_ACCOUNT_PREFIXES):
             amount *= -1
-        return Amount(currency='USD', number=round(Decimal(amount), 2))
+        # Formatting rounds half-to-even on the exact binary value, the same as
+        # round(Decimal(amount), 2), without first expanding every digit of the
+        # float into a Decimal.
+        return Amount(currency='USD', number=Decimal(f'{amount:.2f}'))
 
     def prepare(self, journal, results: SourceResults):
         for account in self.authoritative_accounts:
             results.add_account(account)
 
         # Scan the journal to see which files we have already imported.
-        existing_transactions_by_file = dict()
-        for transaction in journal.all_entries:
-            if not isinstance(transaction, Transaction): continue
-            meta = transaction.meta
-            if (meta and 'workday_payroll_source_file' in meta):
-                filename = meta['workday_payroll_source_file']
-                if not filename.startswith(self.xlsx_dir):
-                    # Ignore files outside the relevant directory. This allows
-                    # this source to be used multiple times with different
-                    # configurations.
-                    continue
-                existing_transactions_by_file.setdefault(filename, []).append(transaction)
+        # Ignore files outside the relevant directory. This allows this source
+        # to be used multiple times with different configurations.
+        existing_transactions_by_file = {
+            filename: transactions
+            for filename, transactions in transactions_by_meta(journal, 'workday_payroll_source_file').items()
+            if filename.startswith(self.xlsx_dir)
+        }
 
         # Read all files and add pending entries not already imported into the journal.
-        imported_transactions_by_file = dict()
+        imported_transactions_by_file = collections.defaultdict(list)
         for filename in self.xlsx_filenames:
             self.log_status('workday_payroll: processing %s' % (filename, ))
 
             with warnings.catch_warnings():
                 warnings.simplefilter("ignore")
-                wb = openpyxl.load_workbook(filename)
-                sh = wb.worksheets[0]
+                # A read-only workbook streams cell values instead of building a
+                # Cell object for every cell, but it must be closed explicitly.
+                wb = openpyxl.load_workbook(filename, read_only=True)
+                try:
+                    sh = wb.worksheets[0]
+                    # A read-only sheet sizes its rows from the <dimension> stored
+                    # in the file, which may be stale. Make it scan the cells
+                    # instead, as a regular workbook does.
+                    sh.reset_dimensions()
+                    rows = list(sh.iter_rows(values_only=True))
+                finally:
+                    wb.close()
 
-            rows = [[cell.value for cell in r] for r in sh.rows]
             tables_by_name = MultiTableReader().read_tables(rows)
 
             date_str = tables_by_name['Payslip Information']['Check Date'][0]
             date = datetime.datetime.strptime(date_str, '%m/%d/%Y').date()
 
             txn = Transaction(
-                meta=collections.OrderedDict(),
+                meta={},
                 date=date,
                 flag='*',
                 payee=self.company_name,
@@ -167,33 +175,44 @@ class WorkdayPayrollSource(Config, Source):
             for section_name, table in tables_by_name.items():
                 if section_name not in self.item_date_to_account_by_section: continue
                 item_date_to_account = self.item_date_to_account_by_section[section_name]
-                for i, row in table.iterrows():
-                    accounts = item_date_to_account(row.iloc[0], date)
-                    if isinstance(accounts, str):
-                        accounts = [accounts]
+                # Every row in a table has the same columns, so find the amount
+                # column once rather than for each row.
+                columns = list(table.columns)
+                if 'Amount' in columns:
+                    amount_index = columns.index('Amount')
+                    currency_index = None
+                elif 'Amount in Pay Group Currency' in columns:
+                    amount_index = columns.index('Amount in Pay Group Currency')
+                    currency_index = columns.index('Pay Group Currency')
+                else:
+                    amount_index = None
+                # Tables can repeat an item name, so call item_date_to_account
+                # only once per item.
+                accounts_by_item_name = {}
+                for row in table.itertuples(index=False, name=None):
+                    item_name = row[0]
+                    accounts = accounts_by_item_name.get(item_name)
+                    if accounts is None:
+                        accounts = item_date_to_account(item_name, date)
+                        if isinstance(accounts, str):
+                            accounts = [accounts]
+                        accounts_by_item_name[item_name] = accounts
+                    if amount_index is None: continue
+                    currency = 'USD' if currency_index is None else row[currency_index]
                     for account in accounts:
-                        if 'Amount' in row:
-                            amount = self._to_amount(row['Amount'], account, 'USD')
-                        elif 'Amount in Pay Group Currency' in row:
-                            amount = self._to_amount(
-                                row['Amount in Pay Group Currency'],
-                                account,
-                                row['Pay Group Currency'],
-                            )
-                        else:
-                            continue
+                        amount = self._to_amount(row[amount_index], account, currency)
                         if amount is None: continue
                         txn.postings.append(
                             Posting(
                                 account=account,
                                 units=amount,
                                 cost=None,
-                                meta={'workday_payroll_posting_description': f'{section_name}: {row.iloc[0]}'},
+                                meta={'workday_payroll_posting_description': f'{section_name}: {item_name}'},
                                 price=None,
                                 flag=None))
 
             if len(txn.postings) > 0:
-                imported_transactions_by_file.setdefault(relative_filename, []).append(txn)
+                imported_transactions_by_file[relative_filename].append(txn)
                 if relative_filename not in existing_transactions_by_file:
                     results.add_pending_entry(ImportResult(date=txn.date, entries=[txn], info=None))
 